@@ -1,25 +1,36 @@
 from __future__ import annotations
 
+import atexit
 import os
 import subprocess
 import sys
 from importlib import resources
 
+# Resolve the packaged bash entry point once at import rather than per
+# invocation; as_file() materializes a real filesystem path even when the
+# package is shipped as a zip/wheel, and the context stays open for the
+# process lifetime so the extracted file remains valid until exit.
+try:
+    _bin_ctx = resources.as_file(resources.files("ralph").joinpath("bin/ralph"))
+    _bin_path: str | None = str(_bin_ctx.__enter__())
+    atexit.register(_bin_ctx.__exit__, None, None, None)
+except Exception:
+    _bin_path = None
 
-def main() -> int:
-    try:
-        ralph_bin = resources.files("ralph").joinpath("bin/ralph")
-    except Exception as exc:
-        print(f"ralph executable not found in package: {exc}", file=sys.stderr)
-        return 1
 
-    if not ralph_bin.exists():
-        print(f"ralph executable not found: {ralph_bin}", file=sys.stderr)
+def main() -> int:
+    if _bin_path is None or not os.path.exists(_bin_path):
+        print("ralph executable not found in package", file=sys.stderr)
         return 1
 
-    args = ["bash", str(ralph_bin), *sys.argv[1:]]
-    result = subprocess.run(args, cwd=os.getcwd())
-    return result.returncode
+    args = ["bash", _bin_path, *sys.argv[1:]]
+    if sys.platform == "win32":
+        # execvp semantics differ on Windows (the parent returns immediately),
+        # so keep the child process there.
+        return subprocess.run(args).returncode
+    # Replace this process with bash directly: no fork, no idle Python parent.
+    # The working directory is inherited, and execvp only returns on failure.
+    os.execvp("bash", args)
 
 
 if __name__ == "__main__":
@@ -16,12 +16,30 @@ Pi format (pi --mode json):
 """
 import json
 import os
+import selectors
+import signal
 import sys
 import time
 from typing import Any, Optional
 
+# orjson parses roughly 2-6x faster than stdlib json on per-line workloads;
+# fall back silently so the parser stays dependency-free.
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    JSON_DECODE_ERRORS: tuple[type[Exception], ...] = (
+        json.JSONDecodeError,
+        orjson.JSONDecodeError,
+    )
+except ImportError:
+    json_loads = json.loads
+    JSON_DECODE_ERRORS = (json.JSONDecodeError,)
+
 
 completion_promise = os.environ.get("RALPH_COMPLETION_PROMISE") or "<promise>DONE</promise>"
+# Precomputed once so the hot loop can search raw bytes without decoding first.
+completion_promise_bytes = completion_promise.encode()
 completion_exit_code = int(os.environ.get("RALPH_COMPLETION_EXIT_CODE", "10"))
 run_start_epoch = int(os.environ.get("RALPH_RUN_START_EPOCH", "0") or "0")
 final_output_header = os.environ.get("RALPH_FINAL_OUTPUT_HEADER", "1").lower() not in {
@@ -34,21 +52,63 @@ provider = os.environ.get("RALPH_PROVIDER", "").lower()
 
 TEXT_BLOCK_TYPES = {"text"}
 
-# Raw log receives the unbuffered stream (avoids tee delays).
+# Raw log lines are batched in user space and flushed to disk every
+# RAW_LOG_BATCH_SIZE events or RAW_LOG_FLUSH_SECS, whichever comes first;
+# a write-per-line was one syscall per event. The time bound matters:
+# bin/ralph's heartbeat tails this log for progress summaries (the reason
+# the parser appends it directly instead of tee), so batching must never
+# leave the file stale for more than a second or two mid-stream.
+# Promise-bearing lines hit disk immediately via flush_raw_log().
 raw_log_path = os.environ.get("RALPH_RAW_LOG_PATH")
 raw_log_file = None
-completion_message: Optional[str] = None
-
-# We record completion but defer exit until EOF to avoid broken-pipe panics
-# when the CLI continues writing after the parser closes stdout.
+raw_log_pending: list[bytes] = []
+raw_log_last_flush = time.monotonic()
+RAW_LOG_BATCH_SIZE = 64
+RAW_LOG_FLUSH_SECS = 1.0
 
 if raw_log_path:
     try:
-        raw_log_file = open(raw_log_path, "a", encoding="utf-8", buffering=1)
+        raw_log_file = open(raw_log_path, "ab", buffering=1 << 16)
     except OSError:
         raw_log_file = None
 
 
+def write_raw_log(line: bytes) -> None:
+    """Queue a raw line for the log, flushing on batch size or age."""
+    raw_log_pending.append(line)
+    if (
+        len(raw_log_pending) >= RAW_LOG_BATCH_SIZE
+        or time.monotonic() - raw_log_last_flush >= RAW_LOG_FLUSH_SECS
+    ):
+        flush_raw_log()
+
+
+def flush_raw_log() -> None:
+    """Drain any pending raw lines and force them to disk."""
+    global raw_log_last_flush
+    if raw_log_pending:
+        raw_log_file.writelines(raw_log_pending)
+        raw_log_pending.clear()
+    raw_log_file.flush()
+    raw_log_last_flush = time.monotonic()
+
+
+def _flush_raw_log_on_term(signum: int, frame: Any) -> None:
+    # bin/ralph's cleanup() TERMs the whole pipeline, and the default SIGTERM
+    # disposition would drop any batched lines. Flush them, then re-raise with
+    # the default handler so the exit status still reports death by signal.
+    try:
+        flush_raw_log()
+    except Exception:
+        pass
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+if raw_log_file:
+    signal.signal(signal.SIGTERM, _flush_raw_log_on_term)
+
+
 def extract_text_from_blocks(
     content: Any,
     *,
@@ -58,19 +118,18 @@ def extract_text_from_blocks(
     """Extract text from content blocks or strings."""
     if isinstance(content, list):
         parts: list[str] = []
+        append = parts.append
         for block in content:
             if not isinstance(block, dict):
                 continue
-            if allowed_types is not None and block.get("type") not in allowed_types:
+            get = block.get
+            if allowed_types is not None and get("type") not in allowed_types:
                 continue
-            block_text = None
             for key in text_keys:
-                value = block.get(key)
-                if isinstance(value, str) and value.strip():
-                    block_text = value
+                # isspace() checks non-emptiness without strip()'s allocation.
+                if isinstance(value := get(key), str) and value and not value.isspace():
+                    append(value)
                     break
-            if block_text:
-                parts.append(block_text)
         if parts:
             return "\n".join(parts)
     elif isinstance(content, str):
@@ -95,7 +154,7 @@ def extract_text_from_message(
 def extract_text_codex(item: dict[str, Any]) -> Optional[str]:
     """Extract text from Codex item format."""
     text = item.get("text")
-    if isinstance(text, str) and text.strip():
+    if isinstance(text, str) and text and not text.isspace():
         return text
     return extract_text_from_blocks(item.get("content"), allowed_types=None)
 
@@ -121,13 +180,6 @@ def is_codex_assistant_item(item: dict[str, Any]) -> bool:
     return item_type == "message" and item.get("role") == "assistant"
 
 
-def record_completion(text: Optional[str]) -> None:
-    """Record completion - keeps the LAST message containing the promise."""
-    global completion_message
-    if text:
-        completion_message = text
-
-
 def extract_codex_event_text(obj: dict[str, Any]) -> Optional[str]:
     """Extract completion text from Codex JSONL events."""
     if obj.get("type") != "item.completed":
@@ -179,61 +231,179 @@ DEFAULT_PROVIDER = {
     "extract_text": extract_nothing,
 }
 provider_config = PROVIDERS.get(provider, DEFAULT_PROVIDER)
-provider_state = {
-    "accumulated_text": "",
-}
 
+# Bind the per-event config lookups once; the hot loop then avoids a dict
+# subscript per line for values that never change after startup.
+extract_text = provider_config["extract_text"]
+skip_event_types = provider_config["skip_event_types"]
+accumulate_text = provider_config["accumulate_text"]
+
+# Byte-level prescan patterns for events we skip entirely: matching lines are
+# dropped before json.loads ever runs. bytes.find is memchr-backed, so this is
+# far cheaper than a full parse on chatty streams.
+SKIP_PATTERNS: tuple[bytes, ...] = tuple(
+    pattern
+    for event_type in provider_config["skip_event_types"]
+    for pattern in (
+        f'"type":"{event_type}"'.encode(),
+        f'"type": "{event_type}"'.encode(),
+    )
+)
+
+# Accumulated text is kept as an append-only list of parts (joined only when
+# the promise is found) plus a bounded rolling tail for the cross-message
+# promise search. Repeated str += was quadratic and re-scanned the full
+# history on every event.
+ACCUMULATED_TAIL_MAX = len(completion_promise) + 4096
 
-def handle_extracted_text(extracted: Optional[str]) -> None:
-    if not extracted:
-        return
-    if provider_config["accumulate_text"]:
-        provider_state["accumulated_text"] += extracted + "\n"
-    if completion_promise and completion_promise in extracted:
-        record_completion(extracted)
-    elif provider_config["accumulate_text"] and completion_promise in provider_state["accumulated_text"]:
-        record_completion(provider_state["accumulated_text"])
+# Read stdin as raw bytes in large chunks rather than via the text-mode line
+# iterator: one UTF-8 decode less per line, far fewer syscalls, and orjson
+# accepts bytes directly.
+READ_CHUNK_SIZE = 1 << 16
 
 
-try:
-    for line in sys.stdin:
+def iter_stdin_lines():
+    """Yield stdin lines as bytes (without trailing newline).
+
+    read1() returns whatever the pipe has ready (up to the chunk size) rather
+    than blocking until a full chunk accumulates, so events still arrive as
+    the CLI emits them. When a raw log is attached, stdin is polled with a
+    RAW_LOG_FLUSH_SECS timeout instead of blocking outright: agent streams go
+    quiet for minutes during tool executions, and pending log lines must
+    still reach disk on that deadline for bin/ralph's heartbeat to see them.
+    """
+    stdin = sys.stdin.buffer
+    read = stdin.read1
+    selector = None
+    if raw_log_file:
         try:
-            obj = json.loads(line)
-        except json.JSONDecodeError:
+            selector = selectors.DefaultSelector()
+            selector.register(stdin, selectors.EVENT_READ)
+        except (OSError, ValueError):
+            # Regular files can't be polled (and never block anyway).
+            selector = None
+    buf = b""
+    while True:
+        if selector is not None:
+            while not selector.select(RAW_LOG_FLUSH_SECS):
+                # Stream is quiet: honor the flush deadline before re-blocking.
+                if raw_log_pending:
+                    flush_raw_log()
+        if not (chunk := read(READ_CHUNK_SIZE)):
+            break
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        yield from lines
+    if buf:
+        yield buf
+
+
+def main() -> None:
+    """Consume the stream, tracking the last promise-bearing message.
+
+    Runs as a function so the hot loop's names are fast locals rather than
+    module globals. Completion is recorded but the exit is deferred until EOF
+    to avoid broken-pipe panics when the CLI continues writing after the
+    parser closes stdout.
+    """
+    completion_message: Optional[str] = None
+    accumulated_parts: list[str] = []
+    accumulated_tail = ""
+
+    # Two specialized handlers, bound once for the fixed provider, so the hot
+    # path never re-tests accumulate_text per event.
+    def handle_no_accumulate(extracted: Optional[str]) -> None:
+        nonlocal completion_message
+        if extracted and completion_promise and completion_promise in extracted:
+            completion_message = extracted
             if raw_log_file:
-                raw_log_file.write(line)
-            # Fast-path in case the stream isn't JSONL.
-            if completion_promise and completion_promise in line and completion_message is None:
-                if raw_log_file:
-                    raw_log_file.flush()
-                record_completion(line)
-            continue
+                flush_raw_log()
+
+    def handle_accumulate(extracted: Optional[str]) -> None:
+        nonlocal completion_message, accumulated_tail
+        if not extracted:
+            return
+        accumulated_parts.append(extracted + "\n")
+        accumulated_tail = (accumulated_tail + extracted + "\n")[-ACCUMULATED_TAIL_MAX:]
+        if completion_promise and completion_promise in extracted:
+            completion_message = extracted
+        elif completion_promise in accumulated_tail:
+            completion_message = "".join(accumulated_parts)
+        else:
+            return
+        if raw_log_file:
+            flush_raw_log()
+
+    handle_extracted_text = handle_accumulate if accumulate_text else handle_no_accumulate
+
+    # Rebind every name the per-line loop touches as a fast local; module
+    # globals would cost a dict lookup per reference on every line.
+    loads = json_loads
+    decode_errors = JSON_DECODE_ERRORS
+    skip_patterns = SKIP_PATTERNS
+    skip_types = skip_event_types
+    promise = completion_promise
+    promise_bytes = completion_promise_bytes
+    log_file = raw_log_file
+    write_log = write_raw_log
+    flush_log = flush_raw_log
+    extract = extract_text
+    handle = handle_extracted_text
+
+    try:
+        for line in iter_stdin_lines():
+            if skip_patterns and any(pattern in line for pattern in skip_patterns):
+                continue
+
+            try:
+                obj = loads(line)
+            except decode_errors:
+                if log_file:
+                    write_log(line + b"\n")
+                # Fast-path in case the stream isn't JSONL; search the raw bytes
+                # so lines without the promise are never decoded.
+                if promise and completion_message is None and promise_bytes in line:
+                    if log_file:
+                        flush_log()
+                    completion_message = line.decode("utf-8", errors="replace")
+                continue
+
+            if log_file:
+                event_type = obj.get("type", "")
+                if event_type not in skip_types:
+                    write_log(line + b"\n")
+
+            handle(extract(obj))
 
+    finally:
         if raw_log_file:
-            event_type = obj.get("type", "")
-            if event_type not in provider_config["skip_event_types"]:
-                raw_log_file.write(line)
-
-        extracted = provider_config["extract_text"](obj)
-        handle_extracted_text(extracted)
-
-finally:
-    msg = completion_message  # local copy for type narrowing
-    if msg:
-        cleaned = msg.replace(completion_promise, "").strip()
-        if cleaned:
-            if final_output_header:
-                print("\r\033[2K", end="", file=sys.stderr, flush=True)
-            if final_output_header and run_start_epoch:
-                elapsed_secs = max(0, int(time.time()) - run_start_epoch)
-                header = f"--- final output | {elapsed_secs // 60}:{elapsed_secs % 60:02d} ---"
-                if raw_log_file:
-                    raw_log_file.write("\n")
-                    raw_log_file.write(f"{header}\n")
-                    raw_log_file.flush()
-                print("", flush=True)
-                print(header, flush=True)
-            print(cleaned, flush=True)
-    if raw_log_file:
-        raw_log_file.close()
-    sys.exit(completion_exit_code if msg else 0)
+            flush_raw_log()
+        msg = completion_message
+        if msg:
+            # split+join strips every promise occurrence in one pass, without
+            # str.replace's intermediate copy of the (possibly large) message.
+            cleaned = "".join(msg.split(completion_promise)).strip()
+            if cleaned:
+                if final_output_header:
+                    # ANSI clear goes to stderr separately; it is a different fd.
+                    sys.stderr.write("\r\033[2K")
+                    sys.stderr.flush()
+                final_output = cleaned + "\n"
+                if final_output_header and run_start_epoch:
+                    elapsed_secs = max(0, int(time.time()) - run_start_epoch)
+                    minutes, seconds = divmod(elapsed_secs, 60)
+                    header = f"--- final output | {minutes}:{seconds:02d} ---"
+                    if raw_log_file:
+                        raw_log_file.write(f"\n{header}\n".encode())
+                        raw_log_file.flush()
+                    final_output = f"\n{header}\n{final_output}"
+                # One write + flush instead of a flushed print per part.
+                sys.stdout.write(final_output)
+                sys.stdout.flush()
+        if raw_log_file:
+            raw_log_file.close()
+        sys.exit(completion_exit_code if msg else 0)
+
+
+if __name__ == "__main__":
+    main()
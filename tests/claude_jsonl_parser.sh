@@ -73,6 +73,13 @@ run_parser_suite() {
     '{"type":"assistant","message":{"content":[{"type":"text","text":"first <promise>DONE</promise>"}]}}' \
     '{"type":"assistant","message":{"content":[{"type":"text","text":"final message <promise>DONE</promise>"}]}}'
 
+  # Promise in one message followed by a promise-free message - the full
+  # accumulated output should be printed, not just the promise message
+  run_one "promise_then_more_output_accumulates" 10 "part one
+part two" \
+    '{"type":"assistant","message":{"content":[{"type":"text","text":"<promise>DONE</promise> part one"}]}}' \
+    '{"type":"assistant","message":{"content":[{"type":"text","text":"part two"}]}}'
+
   # Assistant message with multiple content blocks
   run_one "multiple_content_blocks" 10 "hello
 world" \